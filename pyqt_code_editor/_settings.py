@@ -80,6 +80,8 @@ class Settings(QObject):
     default_filename = SettingProperty('untitled.txt', "Files")
     default_language = SettingProperty('python', "Files")
     default_encoding = SettingProperty('utf-8', "Files")
+    encoding_sample_size = SettingProperty(65536, "Files")  # bytes
+    max_search_file_size = SettingProperty(4194304, "Files")  # bytes
     
     # Keyboard shortcuts
     shortcut_move_line_up = SettingProperty('Alt+Up', "Shortcuts")
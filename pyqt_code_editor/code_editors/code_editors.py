@@ -1,16 +1,30 @@
 import importlib
+from functools import lru_cache
 from .. import utils, settings
 import logging
-logging.basicConfig(level=logging.INFO, force=True)
 logger = logging.getLogger(__name__)
 
-editor_module_cache = {}
-
 # Some languages should be treated as synonyms
 LANGUAGE_MAP = {
     'ipython': 'python'
 }
 
+
+@lru_cache(maxsize=None)
+def _load_editor_module(language):
+    """Loads the editor module for a language, falling back to the generic
+    editor. The result is cached, so that each module is resolved only once.
+    """
+    try:
+        editor_module = importlib.import_module(
+            f".languages.{language}", package=__package__)
+    except ImportError:
+        from .languages import generic as editor_module
+        logger.debug(f'failed to load editor module for {language}, falling back to generic')
+    else:
+        logger.debug(f'loaded editor module for {language}')
+    return editor_module
+
     
 def create_editor(path=None, language=None, *args, **kwargs):
     if language is None:
@@ -19,20 +33,8 @@ def create_editor(path=None, language=None, *args, **kwargs):
         else:
             language = utils.guess_language_from_path(path)
             language = LANGUAGE_MAP.get(language, language)
-    # Load the editor module depending on the language. We store the
-    # imported module in a cache for efficiency
-    if language not in editor_module_cache:
-        try:
-            editor_module = importlib.import_module(
-                f".languages.{language}", package=__package__)
-        except ImportError:
-            from .languages import generic as editor_module
-            logger.info(f'failed to load editor module for {language}, falling back to generic')
-        else:
-            logger.info(f'loaded editor module for {language}')
-        editor_module_cache[language] = editor_module
-    else:
-        editor_module = editor_module_cache[language]
+    # Load the editor module depending on the language
+    editor_module = _load_editor_module(language)
     editor = editor_module.Editor(*args, language=language, **kwargs)
     if path is not None:
         editor.open_file(path)
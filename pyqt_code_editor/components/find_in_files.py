@@ -1,49 +1,169 @@
 import os
+import re
+import queue
+import logging
 import multiprocessing
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from qtpy.QtWidgets import QDockWidget, QWidget, QVBoxLayout, QHBoxLayout, \
     QLabel, QLineEdit, QCheckBox, QPushButton, QTreeWidget, QTreeWidgetItem, \
     QAbstractItemView, QShortcut
-from qtpy.QtCore import Qt, QTimer, Signal
+from qtpy.QtCore import Qt, QTimer, QSocketNotifier, Signal
 from qtpy.QtGui import QKeySequence
+from .. import settings
+logger = logging.getLogger(__name__)
 
-def search_in_files_worker(files, search_text, case_sensitive, whole_word, regex, output_queue):
+# On Windows, the output queue cannot be watched with a socket notifier, and
+# is polled at this interval (ms) instead
+POLL_INTERVAL = 50
+# The number of files that a worker process searches per task
+SEARCH_CHUNK_SIZE = 32
+# The number of bytes at the start of a file that are checked for NUL bytes to
+# recognize binary files
+BINARY_SNIFF_SIZE = 512
+# The queue through which worker processes post results. This is set by
+# init_search_worker() in each worker process.
+_output_queue = None
+
+
+def init_search_worker(output_queue):
     """
-    Runs in a separate process; scans 'files' for 'search_text' and
-    posts partial results to 'output_queue'.
+    Initializes a worker process of the search pool. The queue cannot be
+    passed with each task, and is therefore inherited when the process starts.
     """
-    import re
+    global _output_queue
+    _output_queue = output_queue
+
 
-    flags = 0
-    pattern_text = search_text
+@lru_cache(maxsize=32)
+def compile_search_pattern(search_text, case_sensitive, whole_word, regex):
+    """
+    Compiles the bytes pattern for a search. A search is split into many
+    tasks, and worker processes are reused across searches, so each worker
+    compiles the pattern only once rather than once per task.
+    
+    Plain-text searches without whole-word matching don't need a regular
+    expression. For these, the needle is returned as bytes, lower case if
+    the search is case insensitive.
+    """
+    if not regex and not whole_word:
+        needle = search_text.encode("utf-8")
+        return needle if case_sensitive else needle.lower()
+    # MULTILINE makes ^ and $ match at line boundaries, as they did when
+    # files were searched line by line
+    flags = re.MULTILINE
+    pattern_text = search_text.encode("utf-8")
+    if not regex:
+        pattern_text = re.escape(pattern_text)
     if not case_sensitive:
-        flags = re.IGNORECASE
+        flags |= re.IGNORECASE
     if whole_word:
         # a naive approach with word boundaries
-        pattern_text = r"\b" + pattern_text + r"\b"
+        pattern_text = rb"\b" + pattern_text + rb"\b"
+    return re.compile(pattern_text, flags=flags)
+
+
+def search_buffer(data, compiled_pattern, ignore_case=False):
+    """
+    Searches a bytes buffer with a compiled bytes pattern, and returns a list of
+    (line_number, line) tuples for the lines that contain a match. Each line is
+    reported only once, even if it contains multiple matches.
     
+    The pattern can also be a bytes needle, which is searched for literally
+    with bytes.find(). This is considerably faster than a regular expression.
+    If 'ignore_case' is True, the needle should be lower case.
+    
+    Line endings are normalized to \\n first, as when reading in text mode
+    with universal newlines, so that for example $ matches before \\r\\n.
+    """
+    if b"\r" in data:
+        data = data.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+    literal = isinstance(compiled_pattern, bytes)
+    # Lowering bytes doesn't change offsets, so positions found in the
+    # lowered copy are valid in the original data
+    haystack = data.lower() if literal and ignore_case else data
+    matches = []
+    line_no = 1
+    counted_to = 0
+    pos = 0
+    size = len(data)
+    # A newline at the end of the data doesn't start another line
+    while pos < size:
+        if literal:
+            start = haystack.find(compiled_pattern, pos)
+            if start < 0:
+                break
+        else:
+            match = compiled_pattern.search(data, pos)
+            if match is None:
+                break
+            start = match.start()
+        # A match at the very end, after a trailing newline, is not on a line
+        # (e.g. ^$ or \Z)
+        if start == size and data.endswith(b"\n"):
+            break
+        # Line numbers are derived by counting newlines since the last match
+        line_no += data.count(b"\n", counted_to, start)
+        counted_to = start
+        line_start = data.rfind(b"\n", 0, start) + 1
+        line_end = data.find(b"\n", start)
+        if line_end < 0:
+            line_end = size
+        line = data[line_start:line_end]
+        matches.append((line_no, line.decode("utf-8", errors="replace")))
+        # Continue on the next line
+        pos = line_end + 1
+    return matches
+
+
+def search_in_files_worker(search_id, files, search_text, case_sensitive,
+                           whole_word, regex, max_size):
+    """
+    Runs in a worker process; scans 'files' for 'search_text' and posts
+    partial results to the output queue. Each message is tagged with
+    'search_id', so that results from earlier searches can be ignored. A
+    search consists of multiple calls, one for each chunk of files.
+    
+    Files that are larger than 'max_size' bytes are skipped and reported as
+    such. Binary files, which are recognized by a NUL byte near the start,
+    are skipped silently.
+    
+    Files are read as bytes and searched as a whole with a bytes pattern, so
+    that there is no per-line decoding or matching. As a consequence, case
+    insensitivity and character classes such as \\w only apply to ASCII
+    characters.
+    """
     try:
-        compiled_pattern = re.compile(pattern_text, flags=flags) if regex else re.compile(re.escape(pattern_text), flags=flags)
+        compiled_pattern = compile_search_pattern(search_text, case_sensitive,
+                                                  whole_word, regex)
         
         for file_path in files:
-            matches_for_file = []
             try:
-                with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                    for i, line in enumerate(f):
-                        if compiled_pattern.search(line):
-                            matches_for_file.append((i+1, line.rstrip("\n")))
+                if os.stat(file_path).st_size > max_size:
+                    _output_queue.put(("skipped", search_id, file_path,
+                                       "too large"))
+                    continue
+                with open(file_path, "rb") as f:
+                    head = f.read(BINARY_SNIFF_SIZE)
+                    if b"\0" in head:
+                        continue
+                    data = head + f.read()
             except Exception:
                 # Just skip unreadable files or handle differently
                 continue
-            
+            matches_for_file = search_buffer(data, compiled_pattern,
+                                             not case_sensitive)
             if matches_for_file:
                 # Post partial result
-                output_queue.put(("found", file_path, matches_for_file))
+                _output_queue.put(("found", search_id, file_path,
+                                   matches_for_file))
     except Exception as e:
         # If something goes drastically wrong, we can post an error
-        output_queue.put(("error", str(e)))
+        _output_queue.put(("error", search_id, str(e)))
     
-    # Signal we are done
-    output_queue.put(("done", None))
+    # Signal we are done with this chunk
+    _output_queue.put(("done", search_id))
 
 class FindInFiles(QDockWidget):
     
@@ -54,8 +174,14 @@ class FindInFiles(QDockWidget):
         self.setAllowedAreas(Qt.LeftDockWidgetArea | Qt.RightDockWidgetArea)
         
         self._files = files_list[:]  # store a copy
-        self._search_process = None
+        # The worker pool and its output queue are created on the first search
+        # and then reused
+        self._executor = None
         self._output_queue = None
+        self._notifier = None
+        self._search_id = 0
+        self._search_futures = []
+        self._pending_chunks = 0
         
         central = QWidget(self)
         layout = QVBoxLayout(central)
@@ -92,68 +218,138 @@ class FindInFiles(QDockWidget):
         self.searchBtn.clicked.connect(self._start_search)
         self.resultsTree.itemClicked.connect(self._on_item_clicked)        
         
-        # Timer to poll queue
+        # Timer to poll queue where the queue cannot be watched directly
         self._timer = QTimer(self)
         self._timer.timeout.connect(self._poll_worker)
-        
-        self._timer.setInterval(300)  # every 300 ms
-        self._timer.start()
+        self._timer.setInterval(POLL_INTERVAL)
         
     def showEvent(self, event):
         """Override showEvent to set focus when widget is shown"""
         super().showEvent(event)
         self.searchInput.setFocus()        
     
+    def _get_executor(self):
+        """Returns the worker pool, (re)creating it if necessary."""
+        if self._executor is None:
+            self._output_queue = multiprocessing.Queue()
+            self._executor = ProcessPoolExecutor(
+                max_workers=os.cpu_count(), initializer=init_search_worker,
+                initargs=(self._output_queue,))
+            self._watch_output_queue()
+        return self._executor
+    
+    def _watch_output_queue(self):
+        """Processes results as soon as they arrive, by watching the read end
+        of the queue's pipe. This isn't possible on Windows, where the pipe is
+        not a socket, so there the queue is polled.
+        """
+        if os.name == "nt":
+            self._timer.start()
+            return
+        self._notifier = QSocketNotifier(
+            self._output_queue._reader.fileno(), QSocketNotifier.Read, self)
+        self._notifier.activated.connect(self._poll_worker)
+    
+    def _shutdown_executor(self, kill=False):
+        """Shuts down the worker pool. If kill is True, worker processes are
+        killed as well, rather than allowed to finish their current task.
+        """
+        if self._executor is not None:
+            # The executor doesn't offer a public way to kill its workers
+            # (before Python 3.14), so the processes are killed directly
+            processes = getattr(self._executor, "_processes", None) or {}
+            processes = list(processes.values())
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            if kill:
+                for process in processes:
+                    process.kill()
+        if self._notifier is not None:
+            self._notifier.setEnabled(False)
+            self._notifier.activated.disconnect(self._poll_worker)
+            self._notifier.deleteLater()
+        self._timer.stop()
+        self._executor = None
+        self._output_queue = None
+        self._notifier = None
+    
     def _start_search(self):
-        # Kill any existing worker first
-        if self._search_process and self._search_process.is_alive():
-            self._search_process.terminate()
+        # Cancel chunks of the previous search that haven't started yet.
+        # Chunks that are still running can't be cancelled, and may take
+        # long, for example with a slow regular expression. In that case the
+        # pool is replaced, so that the new search doesn't queue behind them.
+        running = False
+        for future in self._search_futures:
+            if not future.cancel() and future.running():
+                running = True
+        if running:
+            self._shutdown_executor(kill=True)
+        self._search_id += 1
         
         # Clear old results
         self.resultsTree.clear()
         
-        # Prepare
-        self._output_queue = multiprocessing.Queue()
+        # Split the files into chunks, which are searched in parallel
+        chunks = [self._files[i:i + SEARCH_CHUNK_SIZE]
+                  for i in range(0, len(self._files), SEARCH_CHUNK_SIZE)]
         args = (
-            self._files,
             self.searchInput.text(),
             self.caseBox.isChecked(),
             self.wholeWordBox.isChecked(),
             self.regexBox.isChecked(),
-            self._output_queue
+            settings.max_search_file_size
         )
-        
-        # Start process
-        self._search_process = multiprocessing.Process(target=search_in_files_worker, args=args)
-        self._search_process.start()
+        try:
+            self._search_futures = self._submit_chunks(chunks, args)
+        except BrokenProcessPool:
+            # A worker process died, so start with a fresh pool
+            self._shutdown_executor()
+            self._search_futures = self._submit_chunks(chunks, args)
+        self._pending_chunks = len(chunks)
+    
+    def _submit_chunks(self, chunks, args):
+        executor = self._get_executor()
+        return [executor.submit(search_in_files_worker, self._search_id,
+                                chunk, *args) for chunk in chunks]
     
     def _poll_worker(self):
-        if self._search_process is not None:
-            # Check if the process crashed
-            if not self._search_process.is_alive() and self._output_queue.empty():
-                # Worker done or crashed with nothing reported
-                self._search_process = None
-                return
+        if self._output_queue is None:
+            return
+        # Grab everything from the queue
+        while True:
+            try:
+                msg = self._output_queue.get_nowait()
+            except queue.Empty:
+                break
+            if not msg:
+                continue
+            kind, search_id = msg[:2]
+            # Ignore results from earlier searches
+            if search_id != self._search_id:
+                continue
             
-            # Grab everything from the queue
-            while not self._output_queue.empty():
-                msg = self._output_queue.get()
-                if not msg:
-                    continue
-                kind = msg[0]
-                
-                if kind == "found":
-                    # we have file + list of (line_num, text)
-                    file_path = msg[1]
-                    lines = msg[2]
-                    self._add_file_matches(file_path, lines)
-                elif kind == "error":
-                    # The worker had an internal error
-                    error_msg = msg[1]
-                    # You can log or show a message box
-                elif kind == "done":
-                    # done means the worker finished scanning
-                    self._search_process = None
+            if kind == "found":
+                # we have file + list of (line_num, text)
+                file_path = msg[2]
+                lines = msg[3]
+                self._add_file_matches(file_path, lines)
+            elif kind == "skipped":
+                logger.info(f"skipped {msg[2]} in search: {msg[3]}")
+            elif kind == "error":
+                # The worker had an internal error
+                error_msg = msg[2]
+                # You can log or show a message box
+            elif kind == "done":
+                # done means that a worker finished scanning a chunk
+                self._pending_chunks -= 1
+                if self._pending_chunks == 0:
+                    self._search_finished()
+    
+    def _search_finished(self):
+        """Called once all chunks of the current search have been scanned"""
+        # The futures are all done, so there is nothing left to cancel
+        self._search_futures = []
+        logger.info(f"search finished: matches in "
+                    f"{self.resultsTree.topLevelItemCount()} files")
     
     def _add_file_matches(self, file_path, lines):
         # Create a top-level item for file
@@ -192,8 +388,7 @@ class FindInFiles(QDockWidget):
         self.open_file_requested.emit(path, line_no)
     
     def closeEvent(self, event):
-        # Terminate worker process, if any
-        if self._search_process and self._search_process.is_alive():
-            self._search_process.terminate()
-        self._search_process = None
+        # Shut down the worker pool, if any
+        self._search_futures = []
+        self._shutdown_executor()
         super().closeEvent(event)
\ No newline at end of file
@@ -1,14 +1,17 @@
 from qtpy.QtWidgets import (QTabWidget, QWidget, QVBoxLayout, QToolButton, QMenu,
                             QAction, QHBoxLayout)
-from qtpy.QtCore import Signal, QTimer
-from qtconsole.rich_jupyter_widget import RichJupyterWidget
-from qtconsole.manager import QtKernelManager
-from jupyter_client.kernelspec import KernelSpecManager
+from qtpy.QtCore import (Signal, QTimer, QObject, QRunnable, QThreadPool,
+                         QEventLoop)
 import qtawesome as qta
 import os
+import functools
 import logging
-import uuid
-import json
+import ast
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+from collections import OrderedDict
 from concurrent.futures import Future
 from .. import settings
 from ..themes import THEMES, OUTER_CONTENT_MARGINS, HORIZONTAL_SPACING
@@ -16,28 +19,223 @@ from ..widgets import Dock
 from .. import watchdog
 logger = logging.getLogger(__name__)
 
+WORKSPACE_HELPER_NAME = '__pyqce_dump_workspace'
+USER_EXPRESSION_KEY = 'ws'
+# Flags for tracked messages
+MSG_SILENT = 1
+MSG_INTERNAL = 2
+MAX_TRACKED_MESSAGES = 256
+# Message types that are not forwarded to the console for silent executions
+SILENCEABLE_MSG_TYPES = {'execute_result', 'display_data', 'stream', 'error'}
+# The maximum number of variables and the maximum preview length that are
+# included in a workspace update. This keeps the size of the message bounded
+# regardless of the workspace.
+WORKSPACE_MAX_VARS = 200
+WORKSPACE_MAX_PREVIEW = 64
+# The time (ms) after which a workspace query is given up on, for example
+# because the kernel was restarted or shut down while the query was in flight
+WORKSPACE_QUERY_TIMEOUT = 10000
+# This helper is defined once in the kernel namespace, so that workspace
+# updates only need to call it rather than sending and compiling the full
+# introspection code each time.
+WORKSPACE_HELPER_CODE = f"""
+def {WORKSPACE_HELPER_NAME}():
+    import os
+    import json
+    
+    workspace = {{'__kernel_pid': os.getpid()}}
+    n_vars = 0
+    n_more = 0
+    # Get all variables from globals. Only the names are copied, to avoid
+    # changes in size during iteration, and values are looked up by name.
+    namespace = globals()
+    for var_name in list(namespace):
+        # Skip internal variables and modules
+        if var_name.startswith('_') \\
+                or var_name in ('quit', 'exit', 'In', 'Out', 'get_ipython'):
+            continue
+        try:
+            var_value = namespace[var_name]
+        except KeyError:
+            # The variable was removed in the meantime
+            continue
+        # Determine type
+        var_type = type(var_value).__name__
+        if var_type in ('module', 'function', 'type'):
+            continue
+        # Only count variables beyond the maximum
+        if n_vars >= {WORKSPACE_MAX_VARS}:
+            n_more += 1
+            continue
+        n_vars += 1
+        # Create a preview based on type
+        try:
+            if var_type == 'DataMatrix':
+                preview = f"DataMatrix: {{var_value.shape}}"
+            elif var_type == 'DataFrame':
+                preview = f"DataFrame: {{var_value.shape[0]}}×{{var_value.shape[1]}}"
+            elif var_type == 'Series':
+                preview = f"Series: {{len(var_value)}}"
+            elif var_type == 'ndarray':
+                preview = f"Array: {{var_value.shape}}"
+            elif var_type in ('list', 'tuple', 'dict', 'set'):
+                preview = f"{{var_type}}[{{len(var_value)}}]"
+            elif var_type in ('str', 'int', 'float', 'bool'):
+                # For simple types, just use repr with limits. Long strings
+                # are sliced first so that they are not copied as a whole.
+                if var_type == 'str':
+                    preview = repr(var_value[:{WORKSPACE_MAX_PREVIEW}])
+                else:
+                    preview = repr(var_value)
+                if len(preview) > {WORKSPACE_MAX_PREVIEW}:
+                    preview = preview[:{WORKSPACE_MAX_PREVIEW - 3}] + '...'
+            else:
+                # For other types, just show the type
+                preview = f"{{var_type}} object"
+            workspace[var_name] = {{'type': var_type, 'preview': preview}}
+        except Exception as e:
+            workspace[var_name] = {{'type': var_type,
+                                   'preview': f"<Error: {{str(e)}}>"}}
+    if n_more:
+        workspace['__more'] = n_more
+    # Return as JSON, which is evaluated as a user expression
+    return json.dumps(workspace)
+"""
+# The helper can disappear from the kernel namespace, for example after %reset
+# or a restart that isn't noticed here. Therefore, workspace queries execute
+# this code before evaluating the helper, which only defines the helper if it
+# is missing.
+WORKSPACE_ENSURE_HELPER_CODE = f"""
+if {WORKSPACE_HELPER_NAME!r} not in globals():
+    exec({WORKSPACE_HELPER_CODE!r})
+"""
+
+
+# Kernel specs are cached until one of the kernel folders changes, because
+# collecting them requires scanning the file system
+_specs_cache = {'mtime': None, 'data': None}
+_kernel_spec_manager = None
+
+
+@functools.cache
+def home_aware_kernel_spec_manager_class():
+    """Returns the HomeAwareKernelSpecManager class. The class is created on
+    first use so that jupyter_client is only imported when needed.
+    """
+    from jupyter_client.kernelspec import KernelSpecManager
+    
+    class HomeAwareKernelSpecManager(KernelSpecManager):
+        """Reimplements the KernelSpecManager to always search in the Linux
+        home folder. This for example ensures that the local kernels are
+        picked up in a flatpak environment.
+        """
+        def _kernel_dirs_default(self) -> list[str]:
+            dirs = super()._kernel_dirs_default()
+            home_dir = os.path.expanduser("~")
+            jupyter_kernel_dir = os.path.join(
+                home_dir, '.local', 'share', 'jupyter', 'kernels')
+            if os.path.isdir(jupyter_kernel_dir) and os.access(
+                    jupyter_kernel_dir, os.R_OK):
+                if jupyter_kernel_dir not in dirs:
+                    dirs.append(jupyter_kernel_dir)
+            return dirs
+    
+    return HomeAwareKernelSpecManager
+
+
+def get_all_kernel_specs():
+    """Returns all available kernel specs. The specs are cached, and the
+    cache is invalidated when the modification time of one of the kernel
+    folders changes.
+    """
+    global _kernel_spec_manager
+    if _kernel_spec_manager is None:
+        _kernel_spec_manager = home_aware_kernel_spec_manager_class()()
+    mtime = max((os.path.getmtime(d) for d in _kernel_spec_manager.kernel_dirs
+                 if os.path.isdir(d)), default=None)
+    if _specs_cache['data'] is None or _specs_cache['mtime'] != mtime:
+        _specs_cache['data'] = _kernel_spec_manager.get_all_specs()
+        _specs_cache['mtime'] = mtime
+    return _specs_cache['data']
+
 
-class HomeAwareKernelSpecManager(KernelSpecManager):
-    """Reimplements the KernelSpecManager to always search in the Linux home
-    folder. This for example ensures that the local kernels are picked up in a
-    flatpak environment.
+def parse_user_expression(output):
+    """Decodes the result of a user expression, which is received as the
+    repr() of the value. Workspace queries return JSON strings, which are
+    decoded as well.
     """
-    def _kernel_dirs_default(self) -> list[str]:
-        dirs = super()._kernel_dirs_default()
-        home_dir = os.path.expanduser("~")
-        jupyter_kernel_dir = os.path.join(
-            home_dir, '.local', 'share', 'jupyter', 'kernels')
-        if os.path.isdir(jupyter_kernel_dir) and os.access(jupyter_kernel_dir,
-                                                           os.R_OK):
-            if jupyter_kernel_dir not in dirs:
-                dirs.append(jupyter_kernel_dir)
-        return dirs
+    try:
+        value = ast.literal_eval(output)
+    except (ValueError, SyntaxError):
+        return output
+    if isinstance(value, str):
+        try:
+            value = json_loads(value)
+        except ValueError:
+            pass
+    return value
+
+
+class UserExpressionParserSignals(QObject):
+    """Signals to pass the result of a UserExpressionParser back to the main
+    thread. The arguments are the future, the value, and an exception or None.
+    """
+    finished = Signal(object, object, object)
+
+
+class UserExpressionParser(QRunnable):
+    """Decodes the result of a user expression in a background thread, so
+    that the main thread isn't blocked by large workspaces.
+    """
+    def __init__(self, output, future, signals):
+        super().__init__()
+        self._output = output
+        self._future = future
+        self._signals = signals
+        
+    def run(self):
+        try:
+            value, exception = parse_user_expression(self._output), None
+        except Exception as e:
+            value, exception = None, e
+        try:
+            self._signals.finished.emit(self._future, value, exception)
+        except RuntimeError:
+            # The console tab has been closed in the meantime
+            pass
+
+
+@functools.lru_cache
+def jupyter_stylesheet(background_color, font_size, font_family):
+    """Returns the stylesheet for the Jupyter console widget. The stylesheet
+    is cached, because it is identical for all tabs.
+    """
+    return f'''QPlainTextEdit, QTextEdit {{
+            background-color: '{background_color}';
+            background-clip: padding;
+            color: white;
+            font-size: {font_size}pt;
+            font-family: '{font_family}';
+            selection-background-color: #555;
+        }}
+        .inverted {{
+            background-color: white;
+            color: black;
+        }}
+        .error {{ color: red; }}
+        .in-prompt-number {{ font-weight: bold; }}
+        .out-prompt-number {{ font-weight: bold; }}
+        .in-prompt,
+        .in-prompt-number {{ color: lime; }}
+        .out-prompt,
+        .out-prompt-number {{ color: red; }}
+    '''
 
 
 class JupyterConsoleTab(QWidget):
     """Individual tab containing a Jupyter console with its own kernel"""
     
-    execution_complete = Signal(str, object)  # Signal for output interception
+    execution_complete = Signal(str)  # Signal for output interception
     workspace_updated = Signal(dict)  # Signal for workspace updates
     
     def __init__(self, kernel_name=None, parent=None):
@@ -48,10 +246,43 @@ class JupyterConsoleTab(QWidget):
         
         # Dictionary to track pending message results
         self._pending_messages = {}
-        # Set of internal message IDs (for workspace queries, etc.)
-        self._internal_messages = set()
-        # Set of message IDs where output should be hidden
-        self._silent_messages = set()
+        # Dictionary to track pending user-expression results, which are
+        # received through the shell channel
+        self._pending_user_expr = {}
+        # Flags of tracked message IDs. MSG_INTERNAL marks internal queries
+        # (for workspace queries, etc.) and MSG_SILENT marks messages where
+        # output should be hidden. The number of entries is bounded, so that
+        # messages for which the kernel never reports idle don't accumulate.
+        self._message_flags = OrderedDict()
+        # Workspace updates are debounced so that bursts of executions result
+        # in a single workspace query. While a query is in flight, further
+        # requests only mark the workspace as dirty.
+        self._ws_timer = QTimer(self)
+        self._ws_timer.setSingleShot(True)
+        self._ws_timer.setInterval(150)
+        self._ws_timer.timeout.connect(self.update_workspace)
+        self._ws_in_flight = False
+        self._ws_dirty = False
+        # A query that is never answered would otherwise block all further
+        # workspace updates
+        self._ws_future = None
+        self._ws_timeout_timer = QTimer(self)
+        self._ws_timeout_timer.setSingleShot(True)
+        self._ws_timeout_timer.setInterval(WORKSPACE_QUERY_TIMEOUT)
+        self._ws_timeout_timer.timeout.connect(self._on_workspace_timeout)
+        # Handlers that report IOPub messages through execution_complete, or
+        # update the workspace when an execution is complete
+        self._iopub_dispatch = {
+            'status': self._h_status,
+            'execute_result': self._h_execute_result,
+            'stream': self._h_stream,
+            'display_data': self._h_display_data,
+            'error': self._h_error
+        }
+        
+        # The Jupyter stack is heavy, so it's only imported when needed
+        from qtconsole.rich_jupyter_widget import RichJupyterWidget
+        from qtconsole.manager import QtKernelManager
         
         # Create Jupyter console widget
         self.jupyter_widget = RichJupyterWidget()
@@ -63,6 +294,13 @@ class JupyterConsoleTab(QWidget):
         
         self.kernel_client = self.kernel_manager.client()
         self.kernel_client.start_channels()
+        self._parser_signals = UserExpressionParserSignals(self)
+        self._parser_signals.finished.connect(self._on_user_expression_parsed)
+        self.kernel_client.shell_channel.message_received.connect(
+            self._handle_shell_reply)
+        self._install_workspace_helper()
+        # Kernels that died and were automatically restarted lose the helper
+        self.kernel_manager.kernel_restarted.connect(self._on_kernel_restarted)
         
         # Connect the console to the kernel
         self.jupyter_widget.kernel_manager = self.kernel_manager
@@ -72,30 +310,23 @@ class JupyterConsoleTab(QWidget):
         self._setup_output_interception()
         self.jupyter_widget.set_default_style(colors='linux')
         background_color = THEMES[settings.color_scheme]['background_color']
-        stylesheet = f'''QPlainTextEdit, QTextEdit {{
-                background-color: '{background_color}';
-                background-clip: padding;
-                color: white;
-                font-size: {settings.font_size}pt;
-                font-family: '{settings.font_family}';
-                selection-background-color: #555;
-            }}
-            .inverted {{
-                background-color: white;
-                color: black;
-            }}
-            .error {{ color: red; }}
-            .in-prompt-number {{ font-weight: bold; }}
-            .out-prompt-number {{ font-weight: bold; }}
-            .in-prompt,
-            .in-prompt-number {{ color: lime; }}
-            .out-prompt,
-            .out-prompt-number {{ color: red; }}
-        '''
+        stylesheet = jupyter_stylesheet(background_color, settings.font_size,
+                                        settings.font_family)
         self.jupyter_widget.setStyleSheet(stylesheet)
-        
-        # Connect execution_complete to auto-update workspace
-        self.execution_complete.connect(self._on_execution_complete)
+    
+    def _install_workspace_helper(self):
+        """Define the workspace-introspection helper in the kernel namespace"""
+        self.execute_silently(WORKSPACE_HELPER_CODE, internal=True)
+    
+    def _on_kernel_restarted(self):
+        """Resolve queries that will never be answered by the old kernel, and
+        set up the new kernel.
+        """
+        for future in self._pending_user_expr.values():
+            if not future.done():
+                future.set_result({})
+        self._pending_user_expr.clear()
+        self._install_workspace_helper()
     
     def _setup_output_interception(self):
         """Set up output interception to capture kernel output"""
@@ -110,98 +341,168 @@ class JupyterConsoleTab(QWidget):
     
     def _handle_iopub_message(self, msg):
         """Handle messages from the kernel's IOPub channel"""
-        msg_type = msg.get('msg_type', '')
-        content = msg.get('content', {})
-        parent_header = msg.get('parent_header', {})
-        msg_id = parent_header.get('msg_id')
-        
-        # Check if this is a silent execution (output should be hidden)
-        is_silent = msg_id in self._silent_messages
-        
+        msg_type = msg['msg_type']
+        # Fast path: nothing is being tracked, so messages only need to be
+        # reported and forwarded
+        if not (self._pending_messages or self._message_flags):
+            handler = self._iopub_dispatch.get(msg_type)
+            if handler is not None:
+                handler(msg['content'], False)
+            self._original_iopub_handler(msg)
+            return
+        msg_id = msg['parent_header'].get('msg_id')
+        content = msg['content']
+        is_idle = msg_type == 'status' \
+            and content.get('execution_state') == 'idle'
         # Check if this message is a response to a tracked request
-        if msg_id in self._pending_messages:
-            # Handle responses for workspace queries
+        future = self._pending_messages.get(msg_id)
+        if future is not None and not future.done():
+            # Handle responses for queries that capture printed output
             if msg_type == 'stream' and 'text' in content:
-                future = self._pending_messages[msg_id]
-                if not future.done():
-                    try:
-                        # Try to parse JSON output for workspace queries
-                        output = content['text'].strip()
-                        if output:
-                            try:
-                                data = json.loads(output)
-                                future.set_result(data)
-                            except json.JSONDecodeError:
-                                future.set_result(output)
-                    except Exception as e:
-                        logger.error(f"Error processing message: {e}")
-                        future.set_exception(e)
-                        
-            # Check if response is complete
-            elif msg_type == 'status' and content.get('execution_state') == 'idle':
-                # Message processing is complete
-                if msg_id in self._pending_messages:
-                    future = self._pending_messages[msg_id]
-                    # If the future is still not done, set an empty result
-                    if not future.done():
-                        future.set_result({})
-                    # Clean up
-                    self._cleanup_message_ids(msg_id)
-        
+                try:
+                    # Try to parse JSON output
+                    output = content['text'].strip()
+                    if output:
+                        try:
+                            future.set_result(json_loads(output))
+                        except ValueError:
+                            future.set_result(output)
+                except Exception as e:
+                    logger.error(f"Error processing message: {e}")
+                    future.set_exception(e)
+            # If the response is complete without output, set an empty result
+            elif is_idle:
+                future.set_result({})
+        # Check if this is a silent execution (output should be hidden)
+        flags = self._message_flags.get(msg_id, 0)
+        is_silent = bool(flags & MSG_SILENT)
+        is_internal = bool(flags & MSG_INTERNAL)
+        # Clean up once the message has been fully processed. This also
+        # covers silent executions without a pending result, such as user
+        # expressions, whose results arrive through the shell channel.
+        if is_idle and (flags or future is not None):
+            self._cleanup_message_ids(msg_id)
         # Only emit execution_complete for non-internal messages
-        if msg_id not in self._internal_messages:
-            # Detect execution completion with status messages
-            if not is_silent and msg_type == 'status' and content.get('execution_state') == 'idle':
-                # This indicates the execution is complete, regardless of output
-                
-                self.execution_complete.emit('', {})            
-            # Capture execution results for regular code execution
-            if msg_type == 'execute_result':
-                data = content.get('data', {})
-                text_output = data.get('text/plain', '')
-                self.execution_complete.emit(text_output, content)
-            
-            # Capture stdout/stderr
-            elif msg_type in ('stream', 'display_data', 'error'):
-                if msg_type == 'stream':
-                    output = content.get('text', '')
-                elif msg_type == 'display_data':
-                    output = str(content.get('data', {}).get('text/plain', ''))
-                else:  # error
-                    output = '\n'.join(content.get('traceback', []))
-                
-                self.execution_complete.emit(output, content)
-        
+        if not is_internal:
+            handler = self._iopub_dispatch.get(msg_type)
+            if handler is not None:
+                handler(content, is_silent)
         # IMPORTANT: Only forward non-silent messages to the widget
-        if not is_silent or msg_type not in ('execute_result', 'display_data',
-                                             'stream', 'error'):
+        if not is_silent or msg_type not in SILENCEABLE_MSG_TYPES:
             self._original_iopub_handler(msg)
     
+    def _h_status(self, content, is_silent):
+        # An idle status indicates that the execution is complete, regardless
+        # of output. The workspace update is debounced, so this returns
+        # immediately.
+        if not is_silent and content.get('execution_state') == 'idle':
+            self._schedule_workspace_update()
+    
+    def _h_execute_result(self, content, is_silent):
+        # Capture execution results for regular code execution
+        text_output = content.get('data', {}).get('text/plain', '')
+        self.execution_complete.emit(text_output)
+    
+    def _h_stream(self, content, is_silent):
+        # Capture stdout/stderr
+        self.execution_complete.emit(content.get('text', ''))
+    
+    def _h_display_data(self, content, is_silent):
+        output = str(content.get('data', {}).get('text/plain', ''))
+        self.execution_complete.emit(output)
+    
+    def _h_error(self, content, is_silent):
+        output = '\n'.join(content.get('traceback', []))
+        self.execution_complete.emit(output)
+    
+    def _handle_shell_reply(self, msg):
+        """Handle execute replies that carry the result of a user expression"""
+        if msg['msg_type'] != 'execute_reply':
+            return
+        msg_id = msg['parent_header'].get('msg_id')
+        future = self._pending_user_expr.pop(msg_id, None)
+        if future is None or future.done():
+            return
+        result = msg['content'].get('user_expressions', {}).get(
+            USER_EXPRESSION_KEY, {})
+        if result.get('status') != 'ok':
+            future.set_exception(RuntimeError(
+                result.get('evalue', 'user expression failed')))
+            return
+        # Decoding large workspaces is slow, so this happens in a background
+        # thread. The result is passed back to the main thread through a
+        # signal, so that the future's callbacks run there as well.
+        output = result.get('data', {}).get('text/plain', '')
+        QThreadPool.globalInstance().start(
+            UserExpressionParser(output, future, self._parser_signals))
+    
+    def _on_user_expression_parsed(self, future, value, exception):
+        """Resolve a future with the decoded result of a user expression"""
+        if future.done():
+            return
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(value)
+    
     def _cleanup_message_ids(self, msg_id):
-        """Clean up message IDs from tracking sets"""
+        """Clean up message IDs from tracking dicts"""
         self._pending_messages.pop(msg_id, None)
-        self._internal_messages.discard(msg_id)
-        self._silent_messages.discard(msg_id)
+        self._message_flags.pop(msg_id, None)
     
-    def _on_execution_complete(self, output, content):
-        """Automatically update workspace after regular code execution"""
-        # Use a small delay to ensure the kernel has processed everything
-        QTimer.singleShot(100, self.update_workspace)
+    def _schedule_workspace_update(self):
+        """(Re)start the debounce timer for a workspace update. If an update
+        is already in flight, another one is scheduled when it completes.
+        """
+        if self._ws_in_flight:
+            self._ws_dirty = True
+            return
+        self._ws_timer.start()
     
     def update_workspace(self):
         """Trigger a workspace update and emit the signal when complete"""
+        if self._ws_in_flight:
+            self._ws_dirty = True
+            return
+        self._ws_timer.stop()
+        self._ws_in_flight = True
+        self._ws_dirty = False
         future = self.get_workspace_async()
+        self._ws_future = future
+        self._ws_timeout_timer.start()
         future.add_done_callback(self._on_workspace_update_complete)
     
+    def _on_workspace_timeout(self):
+        """Give up on a workspace query that hasn't been answered"""
+        future = self._ws_future
+        if future is None or future.done():
+            return
+        for msg_id, pending in list(self._pending_user_expr.items()):
+            if pending is future:
+                del self._pending_user_expr[msg_id]
+        future.set_exception(TimeoutError('workspace query timed out'))
+    
     def _on_workspace_update_complete(self, future):
         """Handle completion of workspace update"""
+        self._ws_timeout_timer.stop()
+        self._ws_future = None
+        self._ws_in_flight = False
+        if self._ws_dirty:
+            self._ws_dirty = False
+            self._ws_timer.start()
         try:
             workspace_data = future.result()
             logger.info("Workspace updated")
             kernel_pid = workspace_data.pop('__kernel_pid', None)
+            n_more = workspace_data.pop('__more', 0)
+            if n_more:
+                logger.info(f"Workspace truncated, {n_more} variables not shown")
             if kernel_pid is not None:
                 watchdog.register_subprocess(kernel_pid)
             self.workspace_updated.emit(workspace_data)
+        except TimeoutError:
+            # The kernel may simply be busy, so the last workspace is kept
+            logger.info("Workspace query timed out")
         except Exception as e:
             logger.error(f"Error updating workspace: {e}")
             # Emit empty workspace on error
@@ -211,7 +512,8 @@ class JupyterConsoleTab(QWidget):
         """Execute a code snippet in this kernel"""
         return self.jupyter_widget.execute(code)
     
-    def execute_silently(self, code, internal=False, hide_output=True):
+    def execute_silently(self, code, internal=False, hide_output=True,
+                         user_expressions=None):
         """
         Execute code silently without showing it in the console
         
@@ -220,88 +522,82 @@ class JupyterConsoleTab(QWidget):
             internal (bool): If True, marks this as an internal query that 
                             shouldn't trigger workspace updates
             hide_output (bool): If True, hide any output generated by this execution
+            user_expressions (dict): Expressions to evaluate after execution.
+                            The results are sent with the execute reply.
         """
-        msg_id = self.kernel_client.execute(code, silent=True, store_history=False)
-        if msg_id:
-            if internal:
-                self._internal_messages.add(msg_id)
-            if hide_output:
-                self._silent_messages.add(msg_id)
+        msg_id = self.kernel_client.execute(code, silent=True,
+                                            store_history=False,
+                                            user_expressions=user_expressions)
+        flags = (MSG_INTERNAL if internal else 0) \
+            | (MSG_SILENT if hide_output else 0)
+        if msg_id and flags:
+            self._message_flags[msg_id] = flags
+            if len(self._message_flags) > MAX_TRACKED_MESSAGES:
+                self._message_flags.popitem(last=False)
         return msg_id
         
     def execute_and_return_result(self, code, timeout=5.0):
-        """Execute code silently and return the captured output synchronously"""
+        """Execute code silently and return the captured output synchronously.
+        
+        The result is delivered through the Qt event loop. Therefore, a local
+        event loop runs while waiting, rather than blocking on the future,
+        which would deadlock when called from the main thread. This means that
+        other events may be processed before this function returns. None is
+        returned on failure or timeout.
+        """
         future = self.execute_and_get_future(code)
+        if not future.done():
+            loop = QEventLoop()
+            future.add_done_callback(lambda _: loop.quit())
+            timer = QTimer()
+            timer.setSingleShot(True)
+            timer.timeout.connect(loop.quit)
+            timer.start(int(timeout * 1000))
+            loop.exec_()
+            timer.stop()
+        if not future.done():
+            logger.error("Failed to get result: timeout")
+            return None
         try:
-            return future.result(timeout=timeout)
+            return future.result(timeout=0)
         except Exception as e:
             logger.error(f"Failed to get result: {e}")
             return None
             
-    def execute_and_get_future(self, code):
-        """Execute code silently and return a future for the result"""
+    def execute_and_get_future(self, code, kind='stream', setup_code=''):
+        """Execute code silently and return a future for the result
+        
+        Args:
+            code (str): The code to execute. If kind is 'user_expr', this is
+                        an expression that is evaluated as a user expression.
+            kind (str): 'stream' to capture the printed output, or 'user_expr'
+                        to capture the value of an expression from the
+                        execute reply.
+            setup_code (str): If kind is 'user_expr', code that is executed
+                        before the expression is evaluated.
+        """
         future = Future()
-        msg_id = self.execute_silently(code, internal=True, hide_output=True)
+        if kind == 'user_expr':
+            msg_id = self.execute_silently(
+                setup_code, internal=True, hide_output=True,
+                user_expressions={USER_EXPRESSION_KEY: code})
+            pending = self._pending_user_expr
+        else:
+            msg_id = self.execute_silently(code, internal=True,
+                                           hide_output=True)
+            pending = self._pending_messages
         if not msg_id:
             future.set_result(None)
             return future
             
-        self._pending_messages[msg_id] = future
+        pending[msg_id] = future
         return future
     
     def get_workspace_async(self):
         """Asynchronously get the variables in the kernel's workspace"""
-        # Create a unique variable name for results
-        result_var = f"_workspace_data_{uuid.uuid4().hex[:8]}"
-        
-        # Define the code to execute in the kernel
-        code = f"""
-import sys
-import os
-import json
-
-{result_var} = {{'__kernel_pid': os.getpid()}}
-
-# Get all variables from globals
-for __var_name, __var_value in list(globals().items()):
-    # Skip internal variables and modules
-    if __var_name.startswith('_') or __var_name == '{result_var}' \
-            or __var_name in ('quit', 'exit', 'In', 'Out', 'get_ipython'):
-        continue
-    # Determine type
-    __var_type = type(__var_value).__name__
-    if __var_type in ('module', 'function', 'type'):
-        continue
-    
-    # Create a preview based on type
-    try:
-        if __var_type == 'DataMatrix':
-            __preview = f"DataMatrix: {{__var_value.shape}}"
-        elif __var_type == 'DataFrame':
-            __preview = f"DataFrame: {{__var_value.shape[0]}}×{{__var_value.shape[1]}}"
-        elif __var_type == 'Series':
-            __preview = f"Series: {{len(__var_value)}}"
-        elif __var_type == 'ndarray':
-            __preview = f"Array: {{__var_value.shape}}"
-        elif __var_type in ('list', 'tuple', 'dict', 'set'):
-            __preview = f"{{__var_type}}[{{len(__var_value)}}]"
-        elif __var_type in ('str', 'int', 'float', 'bool'):
-            # For simple types, just use repr with limits
-            __preview = repr(__var_value)
-            if len(__preview) > 50:
-                preview = preview[:47] + '...'
-        else:
-            # For other types, just show the type
-            __preview = f"{{__var_type}} object"
-            
-        {result_var}[__var_name] = {{'type': __var_type, 'preview': __preview}}
-    except Exception as e:
-        {result_var}[__var_name] = {{'type': __var_type, 'preview': f"<Error: {{str(e)}}>"}};
-
-# Print as JSON for easy parsing
-print(json.dumps({result_var}))
-"""
-        return self.execute_and_get_future(code)
+        return self.execute_and_get_future(
+            f'{WORKSPACE_HELPER_NAME}()', kind='user_expr',
+            setup_code=WORKSPACE_ENSURE_HELPER_CODE)
     
     def execute_file(self, filepath):
         """Execute a file in this kernel"""
@@ -328,10 +624,24 @@ print(json.dumps({result_var}))
         """Restart the kernel"""
         if self.kernel_manager.has_kernel:
             logger.info(f"Restarting kernel {self.kernel_name}")
+            pid = self._kernel_pid()
+            # This asks for confirmation, and restarts synchronously if the
+            # user agrees
             self.jupyter_widget.request_restart_kernel()
+            # Only a kernel that has actually been restarted starts with an
+            # empty namespace. If the restart cannot be detected, the workspace
+            # queries reinstall the helper themselves.
+            if pid is not None and self._kernel_pid() != pid:
+                self._on_kernel_restarted()
             return True
         return False
     
+    def _kernel_pid(self):
+        """Returns the process ID of the kernel, or None if it is unknown, for
+        example because the kernel doesn't run as a local process.
+        """
+        return getattr(self.kernel_manager.provisioner, 'pid', None)
+    
     def shutdown_kernel(self):
         """Shutdown the kernel"""
         self.kernel_client.stop_channels()
@@ -341,7 +651,7 @@ print(json.dumps({result_var}))
 class JupyterConsole(Dock):
     """Dockable widget containing tabbed Jupyter consoles"""
     
-    execution_complete = Signal(str, object)  # Signal for output interception
+    execution_complete = Signal(str)  # Signal for output interception
     workspace_updated = Signal(dict)  # Signal for workspace updates
     
     def __init__(self, parent=None, default_kernel='python3'):
@@ -406,8 +716,7 @@ class JupyterConsole(Dock):
         self.kernel_menu.clear()
         
         # Get available kernelspecs
-        kernel_spec_manager = HomeAwareKernelSpecManager()
-        specs = kernel_spec_manager.get_all_specs()
+        specs = get_all_kernel_specs()
         
         for spec_name, spec in specs.items():
             display_name = spec['spec']['display_name']
@@ -495,9 +804,9 @@ class JupyterConsole(Dock):
             return console.change_directory(directory)
         return False
     
-    def handle_execution_complete(self, output, result):
+    def handle_execution_complete(self, output):
         """Handle execution complete signal from a console tab"""
-        self.execution_complete.emit(output, result)
+        self.execution_complete.emit(output)
         
     def handle_workspace_updated(self, dict):
         """Handle workspace updated signal from a console tab"""
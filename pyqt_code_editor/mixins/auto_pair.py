@@ -1,4 +1,5 @@
 from qtpy.QtCore import Qt
+from qtpy.QtGui import QTextCursor
 import logging
 logging.basicConfig(level=logging.INFO, force=True)
 
@@ -28,6 +29,17 @@ class AutoPair:
         self.setUndoRedoEnabled(True)
         # For scanning up to the max length of an open_seq
         self._max_open_len = max(len(pair["open_seq"]) for pair in self.PAIRS)
+        self._max_close_len = max(len(pair["close_seq"]) for pair in self.PAIRS)
+        # Lookup tables so that keypresses don't need to scan all pairs. Open
+        # sequences are grouped by length, and longer sequences are checked
+        # first, so that for example triple quotes take precedence over single
+        # quotes.
+        self._open_by_len = {}
+        for pair in self.PAIRS:
+            self._open_by_len.setdefault(
+                len(pair["open_seq"]), {}).setdefault(pair["open_seq"], pair)
+        self._open_lens = sorted(self._open_by_len, reverse=True)
+        self._close_set = {pair["close_seq"] for pair in self.PAIRS}
 
     def keyPressEvent(self, event):
         cursor = self.textCursor()
@@ -41,63 +53,95 @@ class AutoPair:
         
         # 1) Handle backspace for removing empty pairs like (|)
         if event.key() == Qt.Key_Backspace:
-            if self._handle_auto_pair_backspace():
+            if self._handle_auto_pair_backspace(cursor):
                 return
         
         typed_char = event.text()
         
         # Pass the event up (inserts the typed_char)
         super().keyPressEvent(event)
+        if not typed_char:
+            return
         
+        # The cursor has moved, so we get it once more, and use it for all
+        # remaining changes. These are grouped into a single undo step.
+        cursor = self.textCursor()
+        cursor.beginEditBlock()
+        try:
+            changed = self._auto_pair_after_insert(cursor, typed_char, old_pos,
+                                                   selected_text)
+        finally:
+            cursor.endEditBlock()
+        if changed:
+            self.setTextCursor(cursor)
+
+    def _auto_pair_after_insert(self, cursor, typed_char, old_pos,
+                                selected_text) -> bool:
+        """
+        Skips or auto-pairs the character that was just typed, by modifying
+        `cursor`. Returns True if the cursor was changed.
+        """
+        changed = False
         # 2) Possibly skip duplicate closing bracket/quote
         #    when the user manually types it.
-        if typed_char and len(typed_char) == 1:
-            for pair in self.PAIRS:
-                if typed_char == pair["close_seq"]:
-                    new_cursor = self.textCursor()
-                    doc_text = self.toPlainText()
-                    if (new_cursor.position() < len(doc_text) and
-                        doc_text[new_cursor.position()] == typed_char):
-                        # We remove the newly typed character and move cursor forward
-                        new_cursor.beginEditBlock()
-                        # Remove the bracket that was just typed
-                        new_cursor.setPosition(old_pos)
-                        new_cursor.deleteChar()
-                        # Move cursor to skip the existing bracket
-                        new_cursor.setPosition(old_pos + 1)
-                        new_cursor.endEditBlock()
-                        self.setTextCursor(new_cursor)
-                    break
+        if len(typed_char) == 1 and typed_char in self._close_set:
+            # Look at the next character directly, without extracting text.
+            # Closing characters are never paragraph separators, so there's
+            # no need to translate those.
+            doc = self.document()
+            pos = cursor.position()
+            if pos < doc.characterCount() - 1 and \
+                    doc.characterAt(pos) == typed_char:
+                # Remove the bracket that was just typed
+                cursor.setPosition(old_pos)
+                cursor.deleteChar()
+                # Move cursor to skip the existing bracket
+                cursor.setPosition(old_pos + 1)
+                changed = True
         
         # 3) After insertion, see if the text before the cursor matches an 'open_seq'
         #    If it does, insert close_seq + inbetween_seq, then restore cursor.
-        new_cursor = self.textCursor()
-        new_pos = new_cursor.position()
-        text = self.toPlainText()
-        
-        # We'll scan backward from new_pos for up to _max_open_len chars
-        start_search = max(0, new_pos - self._max_open_len)
-        just_typed = text[start_search:new_pos]
+        # We'll scan backward from the cursor for up to _max_open_len chars
+        just_typed, _ = self._text_around_cursor(cursor, self._max_open_len, 0)
         
-        for pair in self.PAIRS:
-            open_seq = pair["open_seq"]
-            close_seq = pair["close_seq"]
-            inbetween_seq = pair["inbetween_seq"]
-            
-            if just_typed.endswith(open_seq) and event.text() == text[new_pos - 1: new_pos]:
-                self._insert_pair(open_seq, close_seq, inbetween_seq,
-                                  selected_text)
-                break
+        if typed_char != just_typed[-1:]:
+            return changed
+        for length in self._open_lens:
+            pair = self._open_by_len[length].get(just_typed[-length:])
+            if pair is not None:
+                self._insert_pair(cursor, pair["open_seq"], pair["close_seq"],
+                                  pair["inbetween_seq"], selected_text)
+                return True
+        return changed
 
+    def _text_around_cursor(self, cursor, before: int,
+                            after: int) -> tuple[str, str]:
+        """
+        Returns the text up to `before` characters before and up to `after`
+        characters after `cursor`. Only this text is extracted, rather than
+        the full document.
+        """
+        pos = cursor.position()
+        max_pos = self.document().characterCount() - 1
+        c = QTextCursor(self.document())
+        c.setPosition(max(0, pos - before))
+        c.setPosition(pos, QTextCursor.KeepAnchor)
+        text_before = c.selectedText()
+        c.setPosition(pos)
+        c.setPosition(min(max_pos, pos + after), QTextCursor.KeepAnchor)
+        text_after = c.selectedText()
+        # Qt uses the paragraph separator instead of newlines
+        return (text_before.replace('\u2029', '\n'),
+                text_after.replace('\u2029', '\n'))
 
-    def _handle_auto_pair_backspace(self) -> bool:
+    def _handle_auto_pair_backspace(self, cursor) -> bool:
         """
         If the cursor is between an exact open_seq and close_seq pair (e.g., '(|)'),
         remove the full pair. Returns True if handled, False if not.
         """
-        cursor = self.textCursor()
         pos = cursor.position()
-        text = self.toPlainText()
+        text_behind, text_ahead = self._text_around_cursor(
+            cursor, self._max_open_len, self._max_close_len)
 
         for pair in self.PAIRS:
             open_seq = pair["open_seq"]
@@ -107,56 +151,51 @@ class AutoPair:
                 l_close = len(close_seq)
                 
                 # Make sure there's enough room before and after the cursor
-                if pos >= l_open and pos + l_close <= len(text):
-                    behind = text[pos - l_open : pos]
-                    ahead = text[pos : pos + l_close]
+                if len(text_behind) >= l_open and len(text_ahead) >= l_close:
+                    behind = text_behind[-l_open:]
+                    ahead = text_ahead[:l_close]
 
                     # If the cursor is right between open_seq and close_seq
                     # with nothing typed in between (e.g. (|))
                     if behind == open_seq and ahead == close_seq:
-                        c = self.textCursor()
-                        c.beginEditBlock()
+                        cursor.beginEditBlock()
                         # Remove from open_seq start to close_seq end
-                        c.setPosition(pos - l_open)
-                        for _ in range(l_open + l_close):
-                            c.deleteChar()
-                        c.endEditBlock()
+                        cursor.setPosition(pos - l_open)
+                        cursor.setPosition(pos + l_close,
+                                           QTextCursor.KeepAnchor)
+                        cursor.removeSelectedText()
+                        cursor.endEditBlock()
 
-                        # Move cursor to the old open_seq start
-                        c.setPosition(pos - l_open)
-                        self.setTextCursor(c)
+                        # The cursor is now at the old open_seq start
+                        self.setTextCursor(cursor)
                         return True
         return False
 
 
-    def _insert_pair(self, open_seq, close_seq, inbetween_seq, selected_text):
+    def _insert_pair(self, cursor, open_seq, close_seq, inbetween_seq,
+                     selected_text):
         """
         Called when we recognize that the user typed an open_seq in full.
-        Insert the close_seq plus any inbetween_seq, and restore the cursor
-        to the original position (right after the open_seq).
+        Insert the close_seq plus any inbetween_seq into `cursor`, and restore
+        the cursor to the original position (right after the open_seq). The
+        caller is responsible for the edit block and for applying the cursor.
         """
-        c = self.textCursor()
-        
         # We'll remember where the user ended up (right after open_seq).
-        old_pos = c.position()
+        old_pos = cursor.position()
         if inbetween_seq == '\n':
             # Get indentation level of block after cursor
             block = self.document().findBlock(old_pos)
             block_text = block.text()
             indent = block_text[:len(block_text) - len(block_text.lstrip())]        
             inbetween_seq = '\n' + indent
-        # Insert the close_seq and inbetween_seq, indented to the same level as the block
-        c.beginEditBlock()
-                
-        # Insert in-between text, then the closing
-        c.insertText(selected_text + inbetween_seq + close_seq)
+        # Insert in-between text, then the closing, indented to the same level
+        # as the block
+        cursor.insertText(selected_text + inbetween_seq + close_seq)
         
         # Move the cursor back so that it's right after the open_seq and (if any)
         # the selected text
-        c.movePosition(c.Left, c.MoveAnchor, len(close_seq) + len(inbetween_seq))
-        
-        c.endEditBlock()
-        self.setTextCursor(c)
+        cursor.movePosition(QTextCursor.Left, QTextCursor.MoveAnchor,
+                            len(close_seq) + len(inbetween_seq))
         
         logging.info(
             "Auto-paired '%s' with '%s', inserted in-between '%s'. "
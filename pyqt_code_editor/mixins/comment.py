@@ -1,7 +1,6 @@
 from qtpy.QtWidgets import QShortcut
-from qtpy.QtGui import QKeySequence
 from qtpy.QtCore import Qt
-from .. import settings
+from .. import settings, utils
 
 
 class Comment:
@@ -17,16 +16,21 @@ class Comment:
                                (default "# " for Python).
         """
         super().__init__(*args, **kwargs)
-        # The text to prepend for a commented line
-        self.code_editor_comment_string
+        # The text to prepend for a commented line, and its length, which is
+        # needed for every line that is uncommented
+        self._comment_string = self.code_editor_comment_string
+        self._comment_string_len = len(self._comment_string)
         self._comment_shortcut = QShortcut(
-            QKeySequence(settings.shortcut_comment), self)
+            utils.key_sequence(settings.shortcut_comment), self)
         self._comment_shortcut.setContext(Qt.WidgetWithChildrenShortcut)
         self._comment_shortcut.activated.connect(self._toggle_comment)
 
     def _toggle_comment(self):
         """Toggle comment on the current selection or current line."""
         cursor = self.textCursor()
+        # Remember the original cursor so that it can be restored afterwards
+        anchor = cursor.anchor()
+        position = cursor.position()
         if not cursor.hasSelection():
             # If no selection, just operate on the current line
             cursor.select(cursor.LineUnderCursor)
@@ -40,52 +44,88 @@ class Comment:
         cursor.setPosition(end, cursor.KeepAnchor)
         endBlock = cursor.blockNumber()
 
-        # Decide whether to comment or uncomment
-        all_commented = True
-        for block_num in range(startBlock, endBlock + 1):
-            block = self.document().findBlockByNumber(block_num)
-            text = block.text()
-            if text.strip() and not text.lstrip().startswith(self.code_editor_comment_string):
-                all_commented = False
-                break
-
-        if all_commented:
-            self._uncomment_blocks(startBlock, endBlock)
-        else:
-            self._comment_blocks(startBlock, endBlock)
-
-    def _comment_blocks(self, start_block: int, end_block: int):
-        """Comment all lines from start_block to end_block."""
-        cursor = self.textCursor()
-        cursor.beginEditBlock()  # group undo steps
-        for block_num in range(start_block, end_block + 1):
-            block = self.document().findBlockByNumber(block_num)
+        # Collect the indentation and comment status of each line in a single
+        # pass, and use it both to decide whether to comment or uncomment and
+        # to build the new text. Blocks are walked with next(), because
+        # findBlockByNumber() is linear in the block number.
+        rows = []
+        first_block = block = self.document().findBlockByNumber(startBlock)
+        for _ in range(endBlock - startBlock + 1):
             if not block.isValid():
-                continue
+                break
             text = block.text()
-            # Insert comment string at first non-whitespace character
-            leading_spaces = len(text) - len(text.lstrip())
-            insert_position = block.position() + leading_spaces
-            cursor.setPosition(insert_position)
-            cursor.insertText(self.code_editor_comment_string)  
+            stripped = text.lstrip()
+            rows.append((text, len(text) - len(stripped), bool(stripped),
+                         stripped.startswith(self._comment_string)))
+            last_block = block
+            block = block.next()
+        if not rows:
+            return
+        all_commented = all(commented or not has_content
+                            for _, _, has_content, commented in rows)
+        new_lines = [self._toggle_comment_line(text, leading_spaces,
+                                               commented, all_commented)
+                     for text, leading_spaces, _, commented in rows]
+        # Nothing changes, for example when only blank lines are selected. The
+        # document is left alone so that it isn't marked as modified.
+        if all(new_line == row[0] for new_line, row in zip(new_lines, rows)):
+            return
+        # Replace all lines at once, so that the document (and thus the
+        # syntax highlighter) only processes a single change
+        start_pos = first_block.position()
+        end_pos = last_block.position() + len(last_block.text())
+        new_anchor = self._map_comment_position(anchor, start_pos, rows,
+                                                all_commented)
+        new_position = self._map_comment_position(position, start_pos, rows,
+                                                  all_commented)
+        cursor.setPosition(start_pos)
+        cursor.setPosition(end_pos, cursor.KeepAnchor)
+        cursor.beginEditBlock()  # group undo steps
+        cursor.insertText('\n'.join(new_lines))
         cursor.endEditBlock()
+        cursor.setPosition(new_anchor)
+        cursor.setPosition(new_position, cursor.KeepAnchor)
+        self.setTextCursor(cursor)
 
-    def _uncomment_blocks(self, start_block: int, end_block: int):
-        """Uncomment all lines from start_block to end_block."""
-        cursor = self.textCursor()
-        cursor.beginEditBlock()
-        for block_num in range(start_block, end_block + 1):
-            block = self.document().findBlockByNumber(block_num)
-            if not block.isValid():
-                continue
-            text = block.text()
-            strip_len = len(self.code_editor_comment_string)
-            # If the line is commented (discount leading whitespace), remove the comment string
-            if text.lstrip().startswith(self.code_editor_comment_string):
-                leading_spaces = len(text) - len(text.lstrip())
-                remove_position = block.position() + leading_spaces
-                cursor.setPosition(remove_position)
-                cursor.setPosition(remove_position + strip_len, cursor.KeepAnchor)
-                if cursor.selectedText() == self.code_editor_comment_string.rstrip('\r\n'):
-                    cursor.removeSelectedText()
-        cursor.endEditBlock()
+    def _toggle_comment_line(self, text: str, leading_spaces: int,
+                             commented: bool, uncomment: bool) -> str:
+        """Returns a single line with the comment string inserted at the
+        first non-whitespace character, or removed if uncomment is True.
+        """
+        if not uncomment:
+            return text[:leading_spaces] + self._comment_string \
+                + text[leading_spaces:]
+        # If the line is commented (discount leading whitespace), remove the comment string
+        if commented:
+            return text[:leading_spaces] \
+                + text[leading_spaces + self._comment_string_len:]
+        return text
+
+    def _map_comment_position(self, pos: int, start_pos: int, rows: list,
+                              uncomment: bool) -> int:
+        """Maps a position from before to after toggling comments, such that
+        it stays at the same character, as it would for individual edits.
+        """
+        strip_len = self._comment_string_len
+        old_line_start = new_line_start = start_pos
+        for text, leading_spaces, _, commented in rows:
+            old_line_end = old_line_start + len(text)
+            col = pos - old_line_start
+            if not uncomment:
+                delta = strip_len
+            elif commented:
+                delta = -strip_len
+            else:
+                delta = 0
+            if pos <= old_line_end:
+                if pos < old_line_start:
+                    return pos
+                if delta > 0 and col >= leading_spaces:
+                    col += delta
+                elif delta < 0 and col > leading_spaces:
+                    col = max(leading_spaces, col + delta)
+                return new_line_start + col
+            # Move to the next line, skipping the newline character
+            old_line_start = old_line_end + 1
+            new_line_start += len(text) + delta + 1
+        return pos + new_line_start - old_line_start
@@ -1,8 +1,8 @@
 from qtpy.QtCore import Signal, Qt, QTimer
-from qtpy.QtGui import QTextCursor, QTextCharFormat, QColor, QKeySequence
+from qtpy.QtGui import QTextCursor, QTextCharFormat, QColor
 from qtpy.QtWidgets import QShortcut, QTextEdit
 from .. python_utils import extract_cells_from_code
-from .. import settings
+from .. import settings, utils
 import logging
 
 logger = logging.getLogger(__name__)
@@ -47,7 +47,7 @@ class Execute:
         super().__init__(*args, **kwargs)
         logger.info("Initializing Execute")
         self.execute_code_shortcut = QShortcut(
-            QKeySequence(settings.shortcut_execute_code), 
+            utils.key_sequence(settings.shortcut_execute_code), 
             self,
             context=Qt.WidgetWithChildrenShortcut
         )
@@ -55,7 +55,7 @@ class Execute:
         
         # Shortcut for executing the entire file
         self.execute_file_shortcut = QShortcut(
-            QKeySequence(settings.shortcut_execute_file), 
+            utils.key_sequence(settings.shortcut_execute_file), 
             self,
             context=Qt.WidgetWithChildrenShortcut
         )
@@ -1,12 +1,151 @@
 import os
+import codecs
 import logging
-import chardet
 from pathlib import Path
-from qtpy.QtCore import QFileSystemWatcher, Signal
+import weakref
+import functools
+from qtpy.QtCore import QFileSystemWatcher, QObject, QTimer, Signal
 from qtpy.QtWidgets import QMessageBox, QFileDialog
 from .. import settings
 logging.basicConfig(level=logging.INFO, force=True)
 logger = logging.getLogger(__name__)
+# The buffer size that is used when saving files
+SAVE_BUFFER_SIZE = 1 << 20
+# Characters that QTextDocument.toPlainText() translates. Line separators
+# (Shift+Enter) and frame markers become newlines, and non-breaking spaces
+# become regular spaces.
+PLAIN_TEXT_TRANSLATION = str.maketrans({
+    '\u2028': '\n',
+    '\u2029': '\n',
+    '\ufdd0': '\n',
+    '\ufdd1': '\n',
+    '\u00a0': ' '
+})
+# File-change notifications that arrive within this interval (ms) are merged
+FILE_CHANGE_DEBOUNCE = 100
+
+
+class SharedFileWatcher(QObject):
+    """
+    Watches the files of all editors with a single QFileSystemWatcher, which
+    is backed by the native file-notification mechanism of the platform (such
+    as inotify on Linux). A single save often results in multiple
+    notifications, so these are merged per path before the editors that
+    watch the path are notified.
+    """
+    def __init__(self):
+        super().__init__()
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.fileChanged.connect(self._on_file_changed)
+        self._editors = {}  # path -> WeakSet of editors
+        # id(editor) -> watched path or None. Editors are removed when they
+        # are destroyed, which also disconnects them from this watcher.
+        self._editor_paths = {}
+        self._changed_paths = set()
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(FILE_CHANGE_DEBOUNCE)
+        self._timer.timeout.connect(self._notify_editors)
+
+    def watch(self, path: str, editor):
+        key = id(editor)
+        if key not in self._editor_paths:
+            editor.destroyed.connect(
+                functools.partial(self._on_editor_destroyed, key))
+        self._editor_paths[key] = path
+        self._editors.setdefault(path, weakref.WeakSet()).add(editor)
+        if path not in self._watcher.files():
+            self._watcher.addPath(path)
+
+    def unwatch(self, path: str, editor):
+        if self._editor_paths.get(id(editor)) == path:
+            self._editor_paths[id(editor)] = None
+        editors = self._editors.get(path)
+        if editors is None:
+            return
+        editors.discard(editor)
+        self._discard_unused_path(path)
+
+    def _discard_unused_path(self, path: str):
+        """Stops watching a path if no editors are watching it anymore."""
+        editors = self._editors.get(path)
+        if editors is not None and not editors:
+            del self._editors[path]
+            self._watcher.removePath(path)
+
+    def _on_editor_destroyed(self, key: int):
+        path = self._editor_paths.pop(key, None)
+        if path is None:
+            return
+        editors = self._editors.get(path)
+        if editors is None:
+            return
+        for editor in list(editors):
+            if id(editor) == key:
+                editors.discard(editor)
+        self._discard_unused_path(path)
+
+    def _on_file_changed(self, path: str):
+        self._changed_paths.add(path)
+        self._timer.start()
+
+    def _notify_editors(self):
+        changed_paths, self._changed_paths = self._changed_paths, set()
+        for path in changed_paths:
+            # Editors may have been garbage collected in the meantime
+            self._discard_unused_path(path)
+            if path not in self._editors:
+                continue
+            # Files that are replaced, rather than modified, are no longer
+            # watched after the change
+            if path not in self._watcher.files() and os.path.exists(path):
+                self._watcher.addPath(path)
+            for editor in list(self._editors[path]):
+                try:
+                    editor._on_file_changed(path)
+                except RuntimeError:
+                    if not _is_deleted(editor):
+                        logger.exception(
+                            f'failed to handle change of {path}')
+                        continue
+                    # The editor has been deleted
+                    self.unwatch(path, editor)
+
+
+def _is_deleted(obj: QObject) -> bool:
+    """Returns True if the C++ object underlying obj has been deleted."""
+    try:
+        obj.objectName()
+    except RuntimeError:
+        return True
+    return False
+
+
+def write_document(document, f):
+    """Writes the plain text of a QTextDocument to a file object, block by
+    block, so that the full text is never copied into a single string. The
+    result is identical to writing document.toPlainText().
+    """
+    block = document.begin()
+    f.write(block.text().translate(PLAIN_TEXT_TRANSLATION))
+    block = block.next()
+    while block.isValid():
+        f.write('\n')
+        f.write(block.text().translate(PLAIN_TEXT_TRANSLATION))
+        block = block.next()
+
+
+_shared_file_watcher = None
+
+
+def shared_file_watcher() -> SharedFileWatcher:
+    """Returns the SharedFileWatcher, which is created on first use because
+    it requires a QApplication.
+    """
+    global _shared_file_watcher
+    if _shared_file_watcher is None:
+        _shared_file_watcher = SharedFileWatcher()
+    return _shared_file_watcher
 
 
 class FileLink:
@@ -14,14 +153,14 @@ class FileLink:
     A mixin for QPlainTextEdit that links the content of the editor to a
     file on disk. By default, the editor is not linked to any file.
 
-    A QFileSystemWatcher monitors the currently opened file. If the file is
+    A SharedFileWatcher monitors the currently opened file. If the file is
     changed on disk, the user is prompted to possibly reload. (See _on_file_changed.)
     """
     file_saved = Signal(object, str)
     file_name_changed = Signal(object, str, str)
     code_editor_file_path = None  # str or None
     code_editor_encoding = None   # str or None
-    _file_watcher = None          # QFileSystemWatcher or None
+    _watched_path = None          # str or None
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -32,33 +171,39 @@ class FileLink:
         """
         Reads the content from a file and sets it as the editor content.
         If the file does not exist, a sensible exception is raised.
-        If no encoding is specified, tries:
-          1) If it's pure ASCII, use 'utf-8'.
+        If no encoding is specified, the encoding is determined based on the
+        first settings.encoding_sample_size bytes of the file:
+          1) If the sample is valid UTF-8 (which includes ASCII), use 'utf-8'.
           2) Else guess with chardet, or default to 'utf-8' if chardet yields None.
+        If the sample is valid UTF-8 but the rest of the file is not, the
+        encoding is guessed with chardet based on the full file.
         """
         path = Path(path)  # ensure we have a Path object
         if not path.is_file():
             raise FileNotFoundError(f"No such file: {path}")
 
-        raw_data = path.read_bytes()
-
         if encoding is None:
-            # First see if everything is within ASCII range
-            try:
-                raw_data.decode("utf-8")
-                # If no error -> it's strictly ASCII, so decode as UTF-8
-                used_encoding = "utf-8"
-            except UnicodeDecodeError:
-                # Not pure ASCII; let chardet pick
-                detect_result = chardet.detect(raw_data)
-                # If detection fails or returns None, default to utf-8
-                used_encoding = detect_result["encoding"] or "utf-8"
+            sample_size = settings.encoding_sample_size
+            with path.open("rb") as fh:
+                sample = fh.read(sample_size)
+            used_encoding = self._detect_encoding(
+                sample, complete=len(sample) < sample_size)
         else:
             used_encoding = encoding
         logger.info(f'opening file as {used_encoding}')
         # Try reading with the chosen encoding
-        with path.open("r", encoding=used_encoding) as f:
-            content = f.read()
+        try:
+            with path.open("r", encoding=used_encoding) as f:
+                content = f.read()
+        except UnicodeDecodeError:
+            if encoding is not None:
+                raise
+            logger.info('file is not valid utf-8 beyond the sample')
+            used_encoding = self._detect_encoding(path.read_bytes(),
+                                                  complete=True)
+            logger.info(f'opening file as {used_encoding}')
+            with path.open("r", encoding=used_encoding) as f:
+                content = f.read()
 
         # Store the content in the editor
         self.setPlainText(content)
@@ -72,6 +217,33 @@ class FileLink:
         self._watch_file(path)
         self.set_modified(False)
 
+    def _detect_encoding(self, data: bytes, complete: bool) -> str:
+        """
+        Returns the encoding of data, which is either the full content of a
+        file (complete=True) or a sample from the start of it. A sample may end
+        in the middle of a multi-byte character, which is ignored.
+        """
+        try:
+            codecs.getincrementaldecoder("utf-8")().decode(data, final=complete)
+        except UnicodeDecodeError:
+            pass
+        else:
+            return "utf-8"
+        # Not UTF-8; let chardet pick. chardet is only imported here, because
+        # most files are UTF-8. The C implementation is much faster, but is an
+        # optional dependency.
+        try:
+            import cchardet as chardet
+        except ImportError:
+            try:
+                import chardet
+            except ImportError:
+                logger.warning('chardet is not available, assuming utf-8')
+                return "utf-8"
+        detect_result = chardet.detect(data)
+        # If detection fails or returns None, default to utf-8
+        return detect_result["encoding"] or "utf-8"
+
     def save_file(self):
         """
         Saves the editor content to the file named code_editor_file_path,
@@ -86,8 +258,11 @@ class FileLink:
         path = Path(self.code_editor_file_path)
         self._saving = True
         try:
-            with path.open("w", encoding=self.code_editor_encoding) as f:
-                f.write(self.toPlainText())
+            # The document is written block by block through a large buffer,
+            # so that the full text is never copied into a single string
+            with path.open("w", encoding=self.code_editor_encoding,
+                           buffering=SAVE_BUFFER_SIZE) as f:
+                write_document(self.document(), f)
         except Exception as e:
             QMessageBox.warning(self, "Error", f"Failed to save file:\n{str(e)}")
         self.set_modified(False)
@@ -126,21 +301,23 @@ class FileLink:
         self.file_name_changed.emit(self, old_path, self.code_editor_file_path)
 
     def _watch_file(self, path: Path):
-        """Set up the QFileSystemWatcher to watch the newly opened or saved file."""
-        # If there's no watcher yet, create one.
-        if self._file_watcher is None:
-            self._file_watcher = QFileSystemWatcher()
-            self._file_watcher.fileChanged.connect(self._on_file_changed)
-
-        # Clear the watcher first (the old file path).
-        self._file_watcher.removePaths(self._file_watcher.files())
-
-        # Now watch the new file
-        self._file_watcher.addPath(str(path))
+        """Set up the shared file watcher to watch the newly opened or saved file."""
+        watcher = shared_file_watcher()
+        path = str(path)
+        # Stop watching the old file path, unless it is unchanged (as after a
+        # regular save), because unwatching it could remove it from the
+        # underlying watcher only for it to be added right back
+        if self._watched_path is not None and self._watched_path != path:
+            watcher.unwatch(self._watched_path, self)
+        # Now watch the new file. This only adds the path to the underlying
+        # watcher if it isn't watched yet, for example because it has been
+        # replaced on disk.
+        self._watched_path = path
+        watcher.watch(path, self)
 
     def _on_file_changed(self, changed_path: str):
         """
-        Called by QFileSystemWatcher whenever the watched file changes on disk.
+        Called by the SharedFileWatcher whenever the watched file changes on disk.
         By default, offers the user to reload. If reloaded, calls open_file again.
         """
         if not self._watch_file_changes:
@@ -169,6 +346,5 @@ class FileLink:
         else:
             logger.info("User chose not to reload. Re-watching file anyway.")
             # Re-add the file to watcher so we keep listening for future changes
-            if self._file_watcher is not None:
-                self._file_watcher.addPath(changed_path)
+            shared_file_watcher().watch(changed_path, self)
         self._watch_file_changes = True
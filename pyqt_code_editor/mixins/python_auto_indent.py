@@ -79,9 +79,10 @@ class PythonAutoIndent:
             # Only if we're in the leading whitespace region:
             if pos_in_block > 0 and pos_in_block <= leading_spaces:
                 # Figure out how many spaces to remove
-                remainder = pos_in_block % settings.tab_width
+                tab_width = settings.tab_width
+                remainder = pos_in_block % tab_width
                 if remainder == 0:
-                    remainder = settings.tab_width
+                    remainder = tab_width
 
                 remove_count = min(remainder, pos_in_block)
                 logging.info("Backspace in leading indentation, removing %d spaces", remove_count)
@@ -107,7 +108,8 @@ class PythonAutoIndent:
             # Only if we're in the leading whitespace region:
             if pos_in_block < leading_spaces:
                 # Figure out how many spaces remain in this "tab chunk"
-                chunk_end = ((pos_in_block // settings.tab_width) + 1) * settings.tab_width
+                tab_width = settings.tab_width
+                chunk_end = ((pos_in_block // tab_width) + 1) * tab_width
                 remove_count = min(chunk_end - pos_in_block, leading_spaces - pos_in_block)
                 logging.info("Delete in leading indentation, removing %d spaces", remove_count)
 
@@ -191,13 +193,14 @@ class PythonAutoIndent:
 
         start_block = self.document().findBlock(start).blockNumber()
         end_block = self.document().findBlock(end).blockNumber()
+        indent = ' ' * settings.tab_width
 
         # Work line by line
         for block_num in range(start_block, end_block + 1):
             block = self.document().findBlockByNumber(block_num)
             tmp_cursor = self.textCursor()
             tmp_cursor.setPosition(block.position())
-            tmp_cursor.insertText(' ' * settings.tab_width)
+            tmp_cursor.insertText(indent)
 
     def _dedent_selection(self):
         """
@@ -212,13 +215,14 @@ class PythonAutoIndent:
 
         start_block = self.document().findBlock(start).blockNumber()
         end_block = self.document().findBlock(end).blockNumber()
+        tab_width = settings.tab_width
 
         for block_num in range(start_block, end_block + 1):
             block = self.document().findBlockByNumber(block_num)
             line_text = block.text()
             leading_spaces = len(line_text) - len(line_text.lstrip(' '))
 
-            remove_spaces = min(settings.tab_width, leading_spaces)
+            remove_spaces = min(tab_width, leading_spaces)
 
             tmp_cursor = self.textCursor()
             tmp_cursor.setPosition(block.position())
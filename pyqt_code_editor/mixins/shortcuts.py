@@ -2,7 +2,7 @@ import logging
 from qtpy.QtWidgets import QShortcut
 from qtpy.QtGui import QTextCursor, QKeySequence
 from qtpy.QtCore import Qt, QEvent
-from .. import settings
+from .. import settings, utils
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, force=True)
 
@@ -15,19 +15,19 @@ class Shortcuts:
         super().__init__(*args, **kwargs)
         # Move line up
         self._shortcut_move_line_up = QShortcut(
-            QKeySequence(settings.shortcut_move_line_up), self)
+            utils.key_sequence(settings.shortcut_move_line_up), self)
         self._shortcut_move_line_up.setContext(Qt.WidgetShortcut)
         self._shortcut_move_line_up.activated.connect(self._move_line_up)
 
         # Move line down
         self._shortcut_move_line_down = QShortcut(
-            QKeySequence(settings.shortcut_move_line_down), self)
+            utils.key_sequence(settings.shortcut_move_line_down), self)
         self._shortcut_move_line_down.setContext(Qt.WidgetShortcut)
         self._shortcut_move_line_down.activated.connect(self._move_line_down)
 
         # Duplicate line
         self._shortcut_duplicate_line = QShortcut(
-            QKeySequence(settings.shortcut_duplicate_line), self)
+            utils.key_sequence(settings.shortcut_duplicate_line), self)
         self._shortcut_duplicate_line.setContext(Qt.WidgetShortcut)
         self._shortcut_duplicate_line.activated.connect(self._duplicate_line)
         
@@ -1,7 +1,7 @@
 import logging
 from qtpy.QtGui import QShortcut
 from qtpy.QtCore import Qt, Signal
-from .. import settings
+from .. import settings, utils
 from ..widgets import QuickSymbolDialog
 logging.basicConfig(level=logging.INFO, force=True)
 logger = logging.getLogger(__name__)
@@ -17,7 +17,8 @@ class Symbols:
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         logger.info("Initializing symbols")
-        self.symbol_shortcut = QShortcut(settings.shortcut_symbols, self)
+        self.symbol_shortcut = QShortcut(
+            utils.key_sequence(settings.shortcut_symbols), self)
         self.symbol_shortcut.setContext(Qt.WidgetWithChildrenShortcut)
         self.symbol_shortcut.activated.connect(self.request_symbols)                
     
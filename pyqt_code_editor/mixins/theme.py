@@ -2,6 +2,7 @@ from pygments.token import Token
 from .. import settings
 from ..syntax_highlighters.syntax_highlighter import create_syntax_highlighter
 import logging
+from functools import lru_cache
 from qtpy.QtGui import QPainter, QColor, QFont, QFontMetrics
 from qtpy.QtWidgets import QPlainTextEdit
 
@@ -18,20 +19,27 @@ class Theme:
     - Toggle visibility of character ruler (based on settings.character_ruler)
     - Toggle word wrap (based on settings.word_wrap)
     """
+    
+    # The colors only depend on the color scheme, so they are shared between
+    # editors, with the color scheme as key.
+    _colors_cache = {}
         
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._highlighter = create_syntax_highlighter(
             self.code_editor_language, self.document(),
             color_scheme=settings.color_scheme)
-        style = self._highlighter._style
-        self.code_editor_colors = {            
-            'background': style.background_color,
-            'highlight': style.highlight_color,
-            'text': '#' + style.style_for_token(Token.Text)['color'],
-            'line-number': '#' + style.style_for_token(Token.Comment)['color'],
-            'border': '#' + style.style_for_token(Token.Comment)['color']
-        }
+        if settings.color_scheme not in Theme._colors_cache:
+            style = self._highlighter._style
+            Theme._colors_cache[settings.color_scheme] = {
+                'background': style.background_color,
+                'highlight': style.highlight_color,
+                'text': '#' + style.style_for_token(Token.Text)['color'],
+                'line-number': '#' + style.style_for_token(Token.Comment)['color'],
+                'border': '#' + style.style_for_token(Token.Comment)['color']
+            }
+        # Each editor gets a copy, so that the shared colors are never modified
+        self.code_editor_colors = Theme._colors_cache[settings.color_scheme].copy()
         self._apply_stylesheet()
         self._apply_word_wrap()
         self._apply_tab_width()
@@ -69,9 +77,11 @@ class Theme:
 
     def paintEvent(self, event):
         super().paintEvent(event)
-        if settings.character_ruler:
+        # Read once, because this runs on every repaint
+        character_ruler = settings.character_ruler
+        if character_ruler:
             char_width = self.fontMetrics().width("x")
-            x_pos = int(char_width * settings.character_ruler + self.contentOffset().x())
+            x_pos = int(char_width * character_ruler + self.contentOffset().x())
             y_pos = self.viewport().height()
             painter = QPainter(self.viewport())
             painter.setPen(QColor(self.code_editor_colors['line-number']))
@@ -91,9 +101,17 @@ class Theme:
         the standard font metrics, because these are not immediately applied on
         initialization.
         """
-        font = QFont()
-        font.setFamily(settings.font_family)
-        font.setPointSize(settings.font_size)
-        self.setTabStopDistance(
-            settings.tab_width * QFontMetrics(font).horizontalAdvance(' '))
+        self.setTabStopDistance(settings.tab_width * _space_width(
+            settings.font_family, settings.font_size))
+
+
+@lru_cache(maxsize=None)
+def _space_width(font_family, font_size):
+    """Returns the width of a space, which is shared between editors with the
+    same font.
+    """
+    font = QFont()
+    font.setFamily(font_family)
+    font.setPointSize(font_size)
+    return QFontMetrics(font).horizontalAdvance(' ')
      
\ No newline at end of file
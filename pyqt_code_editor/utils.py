@@ -1,4 +1,5 @@
 import os
+from functools import lru_cache
 from pygments.lexers import guess_lexer_for_filename
 from pygments.util import ClassNotFound
 
@@ -40,14 +41,28 @@ def shorten_paths(paths):
         parts = p.strip(os.path.sep).split(os.path.sep)
         splitted.append((is_abs, parts))
     
-    # Group by base name (last component)
-    from collections import defaultdict
-    base_map = defaultdict(list)
+    # Build a trie of reversed path components, in which each node keeps
+    # track of the paths that pass through it under the None key
+    trie = {}
     for i, (is_abs, parts) in enumerate(splitted):
-        base_map[parts[-1]].append(i)  # group by last component
+        node = trie
+        for part in reversed(parts):
+            node = node.setdefault(part, {None: []})
+            node[None].append(i)
     
-    # For each group of files sharing the same base name, expand as necessary
-    expansions = [1] * len(splitted)  # how many path parts (from the right) we are using
+    # Each path uses as many components (from the right) as it takes to reach
+    # a node that it doesn't share with any other path. Identical paths never
+    # become unique, and simply use all components.
+    expansions = []
+    for i, (is_abs, parts) in enumerate(splitted):
+        node = trie
+        count = 0
+        for part in reversed(parts):
+            node = node[part]
+            count += 1
+            if len(node[None]) == 1:
+                break
+        expansions.append(count)
     
     def make_short_name(is_abs, parts, count):
         """
@@ -57,33 +72,6 @@ def shorten_paths(paths):
         """
         selected = parts[-count:]
         return "/".join(selected)
-
-    
-    for base_name, indices in base_map.items():
-        if len(indices) == 1:
-            # No conflict, no need to expand
-            continue
-        # We have multiple files with the same base name
-        # so keep expanding path components until unique
-        done = False
-        while not done:
-            # Build short names for all members
-            used_names = {}
-            collisions = False
-            for idx in indices:
-                is_abs, parts = splitted[idx]
-                short = make_short_name(is_abs, parts, expansions[idx])
-                if short in used_names:
-                    collisions = True  # we have a collision
-                used_names[short] = idx
-            if collisions:
-                # Increase expansions for all in this group
-                for idx in indices:
-                    expansions[idx] = min(expansions[idx] + 1, len(splitted[idx][1])) 
-                # If expansions reach the entire path length, it can't expand further.
-                # Next loop check might still find collisions if two paths are identical.
-            else:
-                done = True
     
     # Now build the final short names
     results = []
@@ -95,6 +83,16 @@ def shorten_paths(paths):
     return results
 
 
+@lru_cache(maxsize=None)
+def key_sequence(shortcut):
+    """
+    Returns a QKeySequence for a shortcut string. The result is cached, so that
+    shortcut strings are only parsed once, rather than for every editor.
+    """
+    from qtpy.QtGui import QKeySequence
+    return QKeySequence(shortcut)
+
+
 def get_first_available_font(font_candidates):
     """
     Takes a list of font family names and returns the first
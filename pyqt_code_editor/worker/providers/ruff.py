@@ -1,38 +1,246 @@
 import subprocess
 import tempfile
+import threading
+import queue
 import json
+import hashlib
 import os
 import logging
+from pathlib import Path
+from .. import settings
+from ... import watchdog
 logger = logging.getLogger(__name__)
 
+# Seconds to wait for a response from the ruff language server
+SERVER_TIMEOUT = 5
+# The name of the (non-existent) file that code is checked as
+SNIPPET_FILENAME = 'snippet.py'
+# Files that contain ruff configuration, in the order in which ruff prefers
+# them. pyproject.toml only counts if it has a [tool.ruff] section.
+CONFIG_FILENAMES = ('.ruff.toml', 'ruff.toml', 'pyproject.toml')
+# Results for recently checked code, keyed by a hash of the code. The oldest
+# entry is evicted first.
+RUFF_CACHE_SIZE = 64
+_RUFF_CACHE: dict[str, dict] = {}
 
-def ruff_check(code: str) -> list[dict]:
+
+def find_ruff_config() -> str | None:
+    """Returns the path to the ruff configuration file of the project, or
+    None if there is none. The configuration is looked up as ruff itself does,
+    from the project folder (or else the working directory) upwards. The
+    configuration is passed explicitly to ruff, so that the server and the
+    command line use the same configuration.
     """
-    Lints Python source code using Ruff.
+    folders = [Path.cwd()]
+    project_folder = getattr(settings, 'current_folder', None)
+    if project_folder:
+        folders.insert(0, Path(project_folder))
+    for folder in folders:
+        for parent in (folder, *folder.parents):
+            for filename in CONFIG_FILENAMES:
+                path = parent / filename
+                if not path.is_file():
+                    continue
+                if filename == 'pyproject.toml':
+                    try:
+                        if '[tool.ruff' not in path.read_text(
+                                encoding='utf-8'):
+                            continue
+                    except (OSError, UnicodeDecodeError):
+                        continue
+                return str(path)
+    return None
+
+
+class RuffServer:
+    """A minimal LSP client around a long-lived `ruff server` process. This
+    avoids spawning a new ruff process for every lint, and keeps ruff's caches
+    warm between calls.
+    """
+
+    def __init__(self, config: str | None = None):
+        self._process = subprocess.Popen(
+            ['ruff', 'server'], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL)
+        self.pid = self._process.pid
+        self._messages = queue.Queue()
+        self._request_id = 0
+        self._version = 0
+        # The workspace is an empty temporary folder, so that the server
+        # doesn't scan the project (or the home folder) on startup. The
+        # project's configuration is passed explicitly instead.
+        self._workspace = tempfile.TemporaryDirectory()
+        workspace = Path(self._workspace.name)
+        root_uri = workspace.as_uri()
+        self._snippet_uri = (workspace / SNIPPET_FILENAME).as_uri()
+        server_settings = {} if config is None else {'configuration': config}
+        threading.Thread(target=self._read_messages, daemon=True).start()
+        try:
+            self._request('initialize', {
+                'processId': os.getpid(),
+                'rootUri': root_uri,
+                'workspaceFolders': [{'uri': root_uri,
+                                      'name': workspace.name}],
+                'initializationOptions': {'settings': server_settings},
+                'capabilities': {'textDocument': {'diagnostic': {}}}})
+            self._notify('initialized', {})
+        except Exception:
+            # Don't leave a server behind that failed to initialize
+            self.close()
+            raise
+
+    def _read_messages(self):
+        """Reads Content-Length framed messages from the server's stdout and
+        puts them in the message queue. None signals that the server is gone.
+        """
+        stdout = self._process.stdout
+        try:
+            while True:
+                length = None
+                while True:
+                    header = stdout.readline()
+                    if not header:
+                        return
+                    header = header.strip()
+                    if not header:
+                        break
+                    name, _, value = header.partition(b':')
+                    if name.lower() == b'content-length':
+                        length = int(value)
+                if length is not None:
+                    self._messages.put(json.loads(stdout.read(length)))
+        except Exception as e:
+            logger.error(f'failed to read from ruff server: {e}')
+        finally:
+            self._messages.put(None)
+
+    def _send(self, message):
+        message['jsonrpc'] = '2.0'
+        body = json.dumps(message).encode('utf-8')
+        self._process.stdin.write(
+            f'Content-Length: {len(body)}\r\n\r\n'.encode('ascii') + body)
+        self._process.stdin.flush()
+
+    def _notify(self, method, params):
+        self._send({'method': method, 'params': params})
+
+    def _request(self, method, params):
+        self._request_id += 1
+        request_id = self._request_id
+        self._send({'id': request_id, 'method': method, 'params': params})
+        while True:
+            message = self._messages.get(timeout=SERVER_TIMEOUT)
+            if message is None:
+                raise RuntimeError('ruff server exited')
+            if 'method' in message:
+                # Requests from the server (e.g. configuration) get an empty
+                # reply; notifications (e.g. log messages) are ignored
+                if 'id' in message:
+                    self._send({'id': message['id'], 'result': None})
+                continue
+            if message.get('id') != request_id:
+                continue
+            if 'error' in message:
+                raise RuntimeError(message['error'].get('message'))
+            return message.get('result')
+
+    def check(self, code: str) -> list[dict]:
+        """Returns the LSP diagnostics for the code."""
+        self._version += 1
+        if self._version == 1:
+            self._notify('textDocument/didOpen', {'textDocument': {
+                'uri': self._snippet_uri, 'languageId': 'python', 'version': 1,
+                'text': code}})
+        else:
+            self._notify('textDocument/didChange', {
+                'textDocument': {'uri': self._snippet_uri,
+                                 'version': self._version},
+                'contentChanges': [{'text': code}]})
+        result = self._request('textDocument/diagnostic',
+                               {'textDocument': {'uri': self._snippet_uri}})
+        return result.get('items', []) if result else []
+
+    def close(self):
+        try:
+            self._process.kill()
+            self._process.wait()
+        except Exception:
+            pass
+        self._workspace.cleanup()
+
+
+_server = None
+_server_lock = threading.Lock()
+_server_unavailable = False
+# Set once the server has failed, so that it is restarted at most once
+_server_failed = False
+
+
+def _server_check(code: str) -> dict | None:
+    """Lints the code through the persistent ruff server. The server is
+    started on first use rather than at import, because this module is
+    imported by every worker process. Returns None if the server cannot be
+    used, in which case the caller should fall back to the command line.
     
-    Args:
-        code (str): The Python source code to lint.
+    The server is restarted once after a failure. If it fails again, the
+    command line is used for the rest of the session, so that a broken
+    server doesn't cost a timeout on every check.
     """
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".py", mode="w") as tmp_file:
-        tmp_file.write(code)
-        tmp_file_path = tmp_file.name
-    print(tmp_file.name)
-    cmd = ["ruff", "check", tmp_file_path, "--output-format", "json"]
+    global _server, _server_unavailable, _server_failed
+    with _server_lock:
+        if _server_unavailable:
+            return None
+        if _server is None:
+            try:
+                _server = RuffServer(find_ruff_config())
+            except Exception as e:
+                logger.info(f'ruff server unavailable: {e}')
+                _server_unavailable = True
+                return None
+            # Worker processes don't exit cleanly, so the watchdog makes sure
+            # that the server doesn't outlive the application
+            watchdog.register_subprocess(_server.pid)
+        try:
+            diagnostics = _server.check(code)
+        except Exception as e:
+            logger.error(f'ruff server failed: {e}')
+            _server.close()
+            _server = None
+            _server_unavailable = _server_failed
+            _server_failed = True
+            return None
+    formatted_result = {}
+    for diagnostic in diagnostics:
+        row = diagnostic['range']['start']['line'] + 1
+        if row not in formatted_result:
+            formatted_result[row] = []
+        formatted_result[row].append({
+            'code': diagnostic.get('code'),
+            # The server appends fix hints, which the command line doesn't
+            'message': diagnostic['message'].partition('\n')[0],
+        })
+    return formatted_result
+
+
+def _cli_check(code: str) -> dict | None:
+    cmd = ["ruff", "check", "-", "--stdin-filename", SNIPPET_FILENAME,
+           "--output-format", "json"]
+    config = find_ruff_config()
+    if config is not None:
+        cmd += ["--config", config]
     try:
-        process = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+        process = subprocess.Popen(cmd, stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE,
                                    stderr=subprocess.PIPE, text=True)
-        stdout, stderr = process.communicate()
+        stdout, stderr = process.communicate(code)
     except Exception as e:
         logger.error(f'failed to invoke ruff: {e}')
-        return {}
-    finally:
-        if os.path.exists(tmp_file_path):
-            os.unlink(tmp_file_path)
+        return None
     try:
         result = json.loads(stdout)
     except Exception as e:
         logger.error(f'failed to parse ruff output: {e}')
-        return {}
+        return None
     formatted_result = {}
     for message in result:
         row = message['location']['row']
@@ -43,3 +251,25 @@ def ruff_check(code: str) -> list[dict]:
             'message': message['message'],
         })
     return formatted_result
+
+
+def ruff_check(code: str) -> list[dict]:
+    """
+    Lints Python source code using Ruff.
+
+    Args:
+        code (str): The Python source code to lint.
+    """
+    key = hashlib.blake2b(code.encode(), digest_size=16).hexdigest()
+    if key in _RUFF_CACHE:
+        return _RUFF_CACHE[key]
+    result = _server_check(code)
+    if result is None:
+        result = _cli_check(code)
+    # Failures are not cached, so that they are retried
+    if result is None:
+        return {}
+    _RUFF_CACHE[key] = result
+    if len(_RUFF_CACHE) > RUFF_CACHE_SIZE:
+        del _RUFF_CACHE[next(iter(_RUFF_CACHE))]
+    return result
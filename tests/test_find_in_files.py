@@ -0,0 +1,52 @@
+import re
+from pyqt_code_editor.components import find_in_files
+
+
+def _search(data, search_text, case_sensitive=True, whole_word=False,
+            regex=False):
+    pattern = find_in_files.compile_search_pattern(
+        search_text, case_sensitive, whole_word, regex)
+    return find_in_files.search_buffer(data, pattern, not case_sensitive)
+
+
+def test_search_buffer():
+    data = b"foo\nbar\nfoo bar foo\nbaz"
+    # Line numbers, and multiple matches on one line are reported once
+    assert _search(data, "foo") == [(1, "foo"), (3, "foo bar foo")]
+    assert _search(data, "baz") == [(4, "baz")]
+    assert _search(data, "qux") == []
+    # Regular expressions against a compiled pattern
+    assert find_in_files.search_buffer(
+        data, re.compile(rb"^ba", re.MULTILINE)) == [(2, "bar"), (4, "baz")]
+    
+    
+def test_search_buffer_crlf():
+    data = b"Bar\r\nBaz foo\r\nfoo\r\n"
+    assert _search(data, "foo$", regex=True) == [(2, "Baz foo"), (3, "foo")]
+    assert _search(data, "foo") == [(2, "Baz foo"), (3, "foo")]
+    
+    
+def test_search_buffer_case_insensitive():
+    data = b"FOO\nbar\nFoo bar\n"
+    assert _search(data, "foo", case_sensitive=False) == [
+        (1, "FOO"), (3, "Foo bar")]
+    assert _search(data, "foo", case_sensitive=True) == []
+    
+    
+def test_search_buffer_empty_match():
+    # A trailing newline doesn't result in an extra, empty line
+    assert _search(b"a\nb\n", "x*", regex=True) == [(1, "a"), (2, "b")]
+    assert _search(b"a\nb", "") == [(1, "a"), (2, "b")]
+    # Matches after a trailing newline are not on a line
+    data = b"def f():\n    pass\n"
+    assert _search(data, r"^\s*$", regex=True) == []
+    assert _search(data, r"^$", regex=True) == []
+    assert _search(data, r"\Z", regex=True) == []
+    assert _search(b"a\nb", r"\Z", regex=True) == [(2, "b")]
+    
+    
+if __name__ == "__main__":
+    test_search_buffer()
+    test_search_buffer_crlf()
+    test_search_buffer_case_insensitive()
+    test_search_buffer_empty_match()
@@ -0,0 +1,13 @@
+from pyqt_code_editor import utils
+
+
+def test_shorten_paths():
+    paths = ['/a/x/file.py', '/b/x/file.py', '/c/y/file.py', '/d/other.py',
+             '/q/same.py', '/q/same.py']
+    assert utils.shorten_paths(paths) == [
+        'a/x/file.py', 'b/x/file.py', 'y/file.py', 'other.py', 'q/same.py',
+        'q/same.py']
+    
+    
+if __name__ == "__main__":
+    test_shorten_paths()
@@ -0,0 +1,18 @@
+import io
+from qtpy.QtGui import QTextDocument, QTextCursor
+from pyqt_code_editor.mixins import file_link
+
+
+def test_write_document():
+    document = QTextDocument()
+    cursor = QTextCursor(document)
+    # A soft line break (Shift+Enter) and a non-breaking space
+    cursor.insertText('def f():\n    a = 1\u2028    b\u00a0= 2\n')
+    f = io.StringIO()
+    file_link.write_document(document, f)
+    assert f.getvalue() == document.toPlainText()
+    assert f.getvalue() == 'def f():\n    a = 1\n    b = 2\n'
+    
+    
+if __name__ == "__main__":
+    test_write_document()